@@ -0,0 +1,110 @@
+""" Общее для нагрузочных скриптов: окружение, загрузка bot.py, статистика и запись JSON-отчета """
+import asyncio
+import importlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+try:
+    import resource # Только Unix
+except ImportError:
+    resource = None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def load_bot(workdir=None, **env):
+    """ Импорт bot.py с окружением стенда. bot читает настройки при импорте, поэтому env - до него.
+    DATABASE_URL из окружения процесса (его задает родительский скрипт) не перетирается """
+    if "DATABASE_URL" not in os.environ or workdir:
+        workdir = workdir or tempfile.mkdtemp(prefix="bench-")
+        env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.update({k: str(v) for k, v in env.items()})
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return importlib.import_module("bot")
+
+def percentiles(values):
+    """ p50/p90/p99/max в миллисекундах """
+    if not values:
+        return {"count": 0}
+    data = sorted(values)
+    def pick(q):
+        return round(data[min(len(data) - 1, int(q * len(data)))] * 1000, 3)
+    return {
+        "count": len(data), "mean": round(sum(data) / len(data) * 1000, 3),
+        "p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": round(data[-1] * 1000, 3),
+    }
+
+def rss_bytes():
+    """ Пиковая память процесса (ru_maxrss в Linux - килобайты) """
+    if resource is None: return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def db_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+class LoopLag:
+    """ Насколько event loop опаздывает разбудить sleep: блокирующий вызов в цикле виден сразу """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(time.perf_counter() - started - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return percentiles(self.samples)
+
+async def bounded(coros, limit):
+    sem = asyncio.Semaphore(limit)
+    async def run(coro):
+        async with sem:
+            return await coro
+    return await asyncio.gather(*(run(c) for c in coros))
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def write_result(name, params, results, out_dir=None):
+    """ bench/results/<name>-<время>.json: параметры, окружение и цифры для сравнения прогонов """
+    out_dir = out_dir or RESULTS_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    report = {
+        "benchmark": name,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    path = os.path.join(out_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"-> {path}")
+    return path
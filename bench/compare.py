@@ -0,0 +1,65 @@
+""" Сравнение двух JSON-отчетов одного бенчмарка: что ускорилось, что просело.
+
+Больше - лучше для *_per_sec; меньше - лучше для перцентилей задержек (p50/p90/p99 внутри *_ms),
+памяти и размера базы (*_bytes). Код выхода 1, если хоть одна метрика хуже порога.
+
+    python bench/compare.py bench/results/load-OLD.json bench/results/load-NEW.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ("p50", "p90", "p99")
+
+def metrics(results, prefix=""):
+    """ Плоский список (путь, значение, больше_лучше) из вложенного отчета """
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            if key.endswith("_ms"):
+                for p in PERCENTILES:
+                    if isinstance(value.get(p), (int, float)):
+                        yield f"{path}.{p}", value[p], False
+            else:
+                yield from metrics(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if key.endswith("_per_sec"):
+                yield path, value, True
+            elif key.endswith("_bytes"):
+                yield path, value, False
+
+def compare(old, new, threshold):
+    baseline = {path: value for path, value, _ in metrics(old)}
+    rows, regressions = [], 0
+    for path, value, higher_is_better in metrics(new):
+        before = baseline.get(path)
+        if not before: continue
+        change = (value - before) / before
+        worse = -change if higher_is_better else change
+        regressed = worse > threshold
+        regressions += regressed
+        rows.append((path, before, value, change, regressed))
+    return rows, regressions
+
+def main(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if old.get("benchmark") != new.get("benchmark"):
+        sys.exit(f"разные бенчмарки: {old.get('benchmark')} и {new.get('benchmark')}")
+    if old.get("params") != new.get("params"):
+        print(f"ВНИМАНИЕ: параметры прогонов различаются:\n  {old.get('params')}\n  {new.get('params')}")
+    rows, regressions = compare(old["results"], new["results"], args.threshold)
+    print(f"{old.get('git')} -> {new.get('git')}, порог {args.threshold:.0%}")
+    for path, before, after, change, regressed in rows:
+        print(f"{'!!' if regressed else '  '} {path:<55} {before:>14} -> {after:<14} {change:+.1%}")
+    print(f"Просело метрик: {regressions}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое ухудшение, доля")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+""" Журнал подписок: цена записи события на продлении и скорость пересборки проекции.
+
+1. grant: продления через _grant_db (событие + проекция в одной транзакции) с заданным параллелизмом.
+2. rebuild: журнал на --users пользователей по --events событий (оплаты, отмены, отзывы) пишется
+   напрямую в SQLite, затем rebuild_projection для каждого --batch-sizes; проверяется, что
+   результат совпадает с проекцией, которую вели продления.
+
+    python bench/ledger_rebuild.py --users 100000 --events 5 --batch-sizes 1000 5000 20000
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from common import bounded, db_size, load_bot, percentiles, rss_bytes, write_result
+
+FIELDS = ("start_date", "expiry_date", "is_active", "tariff", "active_order_ref")
+
+def ts(moment):
+    # Формат DateTime в SQLAlchemy для SQLite
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def seed_ledger(bot, path, users, per_user):
+    """ События и согласованная с ними проекция: каждое событие сразу проигрывается через project() """
+    rnd = random.Random(7)
+    started = datetime.now() - timedelta(days=400)
+    events, rows = [], []
+    for i in range(users):
+        tid = 2_000_000 + i
+        state = bot.LedgerState()
+        moment = started + timedelta(minutes=rnd.randrange(60 * 24 * 30))
+        for n in range(per_user):
+            kind = rnd.choices(("payment", "manual_grant", "cancel", "revoke"), (70, 10, 10, 10))[0]
+            days = 30 if kind in ("payment", "manual_grant") else None
+            ref = f"SUB_{tid}_{n}" if kind == "payment" else None
+            ev = bot.SubscriptionEvent(telegram_id=tid, kind=kind, days=days, tariff="T" if days else None,
+                                       order_reference=ref, created_at=moment)
+            bot.project(state, ev)
+            events.append((tid, kind, days, ev.tariff, ref, ts(moment)))
+            moment += timedelta(days=rnd.uniform(1, 40))
+        rows.append((tid, state.tariff, state.start_date and ts(state.start_date),
+                     state.expiry_date and ts(state.expiry_date), state.is_active, state.active_order_ref, per_user))
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO subscription_events (telegram_id, kind, days, tariff, order_reference, created_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", events)
+        conn.executemany("INSERT INTO users (telegram_id, tariff, start_date, expiry_date, is_active, active_order_ref, "
+                         "version, reminder_sent, blocked_bot) VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0)", rows)
+    conn.close()
+    return len(events)
+
+async def bench_grants(bot, args):
+    """ Продления одних и тех же пользователей наперегонки: _grant_db держит блокировку писателя
+    от INSERT до commit, поэтому при большом параллелизме часть ждет дольше busy_timeout """
+    latencies, locked = [], 0
+    async def grant(i):
+        nonlocal locked
+        started = time.perf_counter()
+        try:
+            async with bot.get_session() as session:
+                await bot._grant_db(session, 1_000_000 + i % args.grant_users, 30, "T", kind='payment')
+                await session.commit()
+        except OperationalError:  # database is locked - событие и проекция откатились вместе
+            locked += 1
+            return
+        latencies.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    await bounded([grant(i) for i in range(args.grants)], args.concurrency)
+    elapsed = time.perf_counter() - started
+    return {"grants_per_sec": round(len(latencies) / elapsed, 1), "latency_ms": percentiles(latencies),
+            "locked_errors": locked}
+
+async def snapshot(bot):
+    async with bot.get_session() as session:
+        rows = await session.execute(bot.select(bot.User.telegram_id, *(getattr(bot.User, f) for f in FIELDS)))
+        return {r[0]: tuple(r[1:]) for r in rows}
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench-ledger-")
+    bot = load_bot(workdir)
+    await bot.init_db()
+    results = {"grant": await bench_grants(bot, args)}
+    await bot.engine.dispose()
+
+    started = time.perf_counter()
+    events = seed_ledger(bot, bot.engine.url.database, args.users, args.events)
+    results["seed_sec"] = round(time.perf_counter() - started, 2)
+    expected = await snapshot(bot)
+    rebuilds = {}
+    for batch_size in args.batch_sizes:
+        stats = await bot.rebuild_projection(batch_size=batch_size)
+        stats["events_per_sec"] = round(stats["events"] / stats["total_sec"])
+        stats["matches_projection"] = await snapshot(bot) == expected
+        rebuilds[f"batch_{batch_size}"] = stats
+    results["rebuild"] = rebuilds
+    results["ledger_events"] = events + args.grants - results["grant"]["locked_errors"]
+    results["db_bytes"] = db_size(bot.engine.url.database)
+    results["rss_bytes"] = rss_bytes()
+    await bot.engine.dispose()
+    write_result("ledger_rebuild", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--events", type=int, default=5, help="событий на пользователя")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--grants", type=int, default=2000)
+    parser.add_argument("--grant-users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,297 @@
+""" Нагрузочный прогон bot.py против локальных заглушек Telegram и WayForPay.
+
+Поднимает настоящее aiohttp-приложение (create_app, режим webhook) и шлет в него апдейты
+Telegram и колбэки WayForPay. Задержка считается от отправки запроса до момента, когда
+заглушка Telegram получила ответное сообщение пользователю. Сценарии:
+
+    burst     /start новых пользователей вперемешку с одобренными оплатами без счета
+    taps      каждый пользователь: /start -> профиль -> "Купить" -> кнопка тарифа (счет в заглушке WFP)
+    checkout  кнопка тарифа -> счет -> одобренный колбэк по этому счету -> сообщение о выдаче доступа
+    expiry    --expired истекших подписок и проход check_subs_job, параллельно /start других пользователей
+
+    python bench/load.py --scenarios taps checkout expiry --users 500 --webhooks 500 --expired 5000
+    python bench/load.py --blocking-db   # для сравнения: синхронная запись в SQLite прямо в цикле
+    python bench/compare.py bench/results/load-OLD.json bench/results/load-NEW.json
+
+Ответ на колбэк WFP (webhook_response_ms) ждет commit пачки колбэков (PaymentInbox). Измерено на
+одном ядре, клиент и заглушки в том же процессе: только колбэки (--users 0 --webhooks 300
+--concurrency 50) - p50 ~15 мс, p99 ~70 мс; вперемешку с /start - p50 ~30 мс, p99 ~200 мс:
+запись новых пользователей идет мимо PaymentInbox.lock и делит писателя SQLite через busy_timeout.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+from sqlalchemy import insert
+
+from common import LoopLag, bounded, db_size, free_port, load_bot, percentiles, rss_bytes, write_result
+from stubs import FakeTelegram, FakeWayForPay, serve
+
+SECRET = "bench-secret"
+BASE_UID = 10_000_000
+# У каждого сценария свои пользователи: прогоны в одном процессе не пересекаются
+TAPS_UID, CHECKOUT_UID, EXPIRED_UID, SWEEP_START_UID = 20_000_000, 30_000_000, 40_000_000, 50_000_000
+PROFILE_TEXT, BUY_TEXT = "👤 Профиль / Статус", "💳 Купить подписку"
+_update_ids = itertools.count(1_000_000)
+
+def message_update(update_id, uid, text):
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else None
+    message = {"message_id": update_id, "date": int(time.time()), "text": text,
+               "chat": {"id": uid, "type": "private"},
+               "from": {"id": uid, "is_bot": False, "first_name": f"U{uid}"}}
+    if entities: message["entities"] = entities
+    return {"update_id": update_id, "message": message}
+
+def callback_update(update_id, uid, data):
+    """ Нажатие инлайн-кнопки под сообщением бота """
+    user = {"id": uid, "is_bot": False, "first_name": f"U{uid}"}
+    message = {"message_id": update_id, "date": int(time.time()), "text": "Выберите тарифный план:",
+               "chat": {"id": uid, "type": "private"}, "from": {"id": 1, "is_bot": True, "first_name": "bench"}}
+    return {"update_id": update_id, "callback_query": {"id": str(update_id), "from": user, "chat_instance": str(uid),
+                                                       "data": data, "message": message}}
+
+def payment_callback(bot, order_ref, amount, status="Approved"):
+    data = {"merchantAccount": bot.MERCHANT_ACCOUNT, "orderReference": order_ref, "amount": amount,
+            "currency": "UAH", "authCode": "123456", "cardPan": "41****1111",
+            "transactionStatus": status, "reasonCode": 1100, "processingDate": int(time.time())}
+    data["merchantSignature"] = bot.signer.sign_fields(data.get(f) for f in bot.WayForPaySigner.CALLBACK_FIELDS)
+    return data
+
+class BlockingDbMiddleware:
+    """ Эмуляция прежнего синхронного SessionLocal: запись с commit прямо в event loop на каждый запрос """
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS blocking (id INTEGER PRIMARY KEY, at REAL)")
+
+    def touch(self):
+        self.conn.execute("INSERT INTO blocking (at) VALUES (?)", (time.time(),))
+        self.conn.commit()
+
+class Stand:
+    """ Заглушки + приложение бота на свободных портах """
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="bench-load-")
+        self.tg = FakeTelegram(latency=args.tg_latency)
+        self.wfp = FakeWayForPay(latency=args.wfp_latency)
+        self.runners = []
+
+    async def start(self):
+        tg_port, wfp_port, self.app_port = free_port(), free_port(), free_port()
+        self.runners.append(await serve(self.tg.app(), tg_port))
+        self.runners.append(await serve(self.wfp.app(), wfp_port))
+        self.bot = load_bot(
+            self.workdir,
+            BOT_MODE="webhook", TG_WEBHOOK_SECRET=SECRET,
+            TG_API_URL=f"http://127.0.0.1:{tg_port}",
+            WFP_PAY_URL=f"http://127.0.0.1:{wfp_port}/pay",
+            WFP_API_URL=f"http://127.0.0.1:{wfp_port}/regularApi",
+            BASE_WEBHOOK_URL=f"http://127.0.0.1:{self.app_port}",
+            TG_GLOBAL_RATE=self.args.tg_rate,
+            WEB_REUSE_PORT="0",
+        )
+        self.db_path = self.bot.engine.url.database
+        app = self.bot.create_app()
+        if self.args.blocking_db:
+            blocking = BlockingDbMiddleware(os.path.join(self.workdir, "blocking.db"))
+            from aiohttp import web
+            @web.middleware
+            async def block(request, handler):
+                blocking.touch()
+                return await handler(request)
+            app.middlewares.append(block)
+        self.runners.append(await serve(app, self.app_port))
+        self.base = f"http://127.0.0.1:{self.app_port}"
+        self.http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.args.concurrency))
+
+    async def stop(self):
+        await self.http.close()
+        for runner in reversed(self.runners):
+            await runner.cleanup()
+
+    async def telegram(self, update, chat_id):
+        """ Апдейт в вебхук Telegram; задержка - до ответного сообщения в этот чат """
+        reply = self.tg.wait_message(chat_id)
+        started = time.perf_counter()
+        async with self.http.post(self.base + self.bot.TG_WEBHOOK_PATH, json=update,
+                                  headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+            resp.raise_for_status()
+        return await asyncio.wait_for(reply, self.args.timeout) - started
+
+    async def payment(self, data, chat_id):
+        """ Колбэк WayForPay: (время ответа вебхука, время до сообщения о выдаче доступа) """
+        granted = self.tg.wait_message(chat_id)
+        started = time.perf_counter()
+        async with self.http.post(self.base + self.bot.WEBHOOK_PATH, json=data) as resp:
+            resp.raise_for_status()
+            answered = time.perf_counter()
+        return answered - started, await asyncio.wait_for(granted, self.args.timeout) - started
+
+async def scenario_burst(stand, args):
+    """ /start от новых пользователей вперемешку с оплатами других пользователей """
+    bot = stand.bot
+    starts = [stand.telegram(message_update(i + 1, BASE_UID + i, "/start"), BASE_UID + i)
+              for i in range(args.users)]
+    payments = [stand.payment(payment_callback(bot, f"SUB_{BASE_UID + args.users + i}_1_bench{i}", 1),
+                              BASE_UID + args.users + i)
+                for i in range(args.webhooks)]
+    started = time.perf_counter()
+    results = await bounded(starts + payments, args.concurrency)
+    elapsed = time.perf_counter() - started
+    start_lat = results[:args.users]
+    webhook_lat = [r[0] for r in results[args.users:]]
+    grant_lat = [r[1] for r in results[args.users:]]
+    return {
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(results) / elapsed, 1),
+        "start_reply_ms": percentiles(start_lat),
+        "webhook_response_ms": percentiles(webhook_lat),
+        "payment_to_grant_ms": percentiles(grant_lat),
+    }
+
+async def scenario_taps(stand, args):
+    """ Путь пользователя по меню: каждый шаг ждет ответа бота, пользователи идут параллельно """
+    tariff = next(iter(stand.bot.TARIFFS))
+    steps = {"start": "/start", "profile": PROFILE_TEXT, "buy_menu": BUY_TEXT, "tariff": f"buy_{tariff}"}
+    latencies = {step: [] for step in steps}
+    async def user(i):
+        uid = TAPS_UID + i
+        for step, text in steps.items():
+            update = (callback_update(next(_update_ids), uid, text) if step == "tariff"
+                      else message_update(next(_update_ids), uid, text))
+            latencies[step].append(await stand.telegram(update, uid))
+    started = time.perf_counter()
+    await bounded([user(i) for i in range(args.users)], args.concurrency)
+    elapsed = time.perf_counter() - started
+    taps = args.users * len(steps)
+    return {
+        "seconds": round(elapsed, 3),
+        "taps_per_sec": round(taps / elapsed, 1),
+        **{f"{step}_reply_ms": percentiles(v) for step, v in latencies.items()},
+        "invoices_created": len({uid for uid in stand.wfp.orders if uid >= TAPS_UID and uid < CHECKOUT_UID}),
+    }
+
+async def scenario_checkout(stand, args):
+    """ Счет через кнопку тарифа, затем одобренный колбэк WayForPay именно по этому счету """
+    bot = stand.bot
+    tariff = next(iter(bot.TARIFFS))
+    async def buyer(i):
+        uid = CHECKOUT_UID + i
+        invoice = await stand.telegram(callback_update(next(_update_ids), uid, f"buy_{tariff}"), uid)
+        order_ref, amount = stand.wfp.orders[uid]
+        webhook, grant = await stand.payment(payment_callback(bot, order_ref, amount), uid)
+        return invoice, webhook, grant
+    started = time.perf_counter()
+    results = await bounded([buyer(i) for i in range(args.webhooks)], args.concurrency)
+    elapsed = time.perf_counter() - started
+    async with bot.get_session() as session:
+        paid = await session.scalar(bot.select(bot.func.count()).select_from(bot.Invoice)
+                                    .where(bot.Invoice.telegram_id >= CHECKOUT_UID, bot.Invoice.paid_at != None))
+    return {
+        "seconds": round(elapsed, 3),
+        "checkouts_per_sec": round(len(results) / elapsed, 1),
+        "tap_to_invoice_ms": percentiles([r[0] for r in results]),
+        "webhook_response_ms": percentiles([r[1] for r in results]),
+        "payment_to_grant_ms": percentiles([r[2] for r in results]),
+        "invoices_paid": paid,
+    }
+
+def expired_order_ref(i):
+    """ Половина истекших без автоплатежа; у остальных WFP ответит, что списание прошло
+    (вебхук потерялся - проход продлит) или что автоплатеж снят (проход отзовет) """
+    if i % 2 == 0: return None
+    return f"SUB_{EXPIRED_UID + i}_1_{'renewed' if i % 4 == 1 else 'removed'}"
+
+async def seed_expired(bot, count):
+    now = datetime.now()
+    rows = [{"telegram_id": EXPIRED_UID + i, "tariff": "T", "is_active": True, "version": 1,
+             "start_date": now - timedelta(days=31), "expiry_date": now - timedelta(hours=1),
+             "active_order_ref": expired_order_ref(i),
+             "invite_link": f"https://t.me/+exp{i}", "reminder_sent": True, "blocked_bot": False}
+            for i in range(count)]
+    async with bot.get_session() as session:
+        for start in range(0, len(rows), 5000):
+            await session.execute(insert(bot.User), rows[start:start + 5000])
+        await session.commit()
+
+async def scenario_expiry(stand, args):
+    """ Массовое истечение: проход по подпискам так же, как его запускает планировщик,
+    и /start других пользователей в это время - проход не должен душить интерактив """
+    bot = stand.bot
+    await seed_expired(bot, args.expired)
+    default_status = stand.wfp.status_for
+    stand.wfp.status_for = lambda ref: ({"status": "Removed"} if ref.endswith("_removed") else default_status(ref))
+    banned_before, removed_before = len(stand.tg.banned), stand.wfp.calls["REMOVE"]
+    sweep = bot.singleton_job("check_subs", bot.check_subs_job, bot.JOB_LOCK_TTL)
+    started = time.perf_counter()
+    sweep_task = asyncio.ensure_future(sweep())
+    starts = []
+    async def trickle():
+        for i in range(args.sweep_starts):
+            if sweep_task.done(): break
+            uid = SWEEP_START_UID + i
+            starts.append(await stand.telegram(message_update(next(_update_ids), uid, "/start"), uid))
+    await trickle()
+    stats = await sweep_task
+    elapsed = time.perf_counter() - started
+    # Сообщения "подписка истекла" уходят через очередь: ждем, пока она опустеет
+    deadline = time.monotonic() + args.timeout
+    while bot.outbox.queue.qsize() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return {
+        "seconds": round(elapsed, 3),
+        "expired_per_sec": round(args.expired / elapsed, 1),
+        "sweep": stats,
+        "banned": len(stand.tg.banned) - banned_before,
+        "wfp_removed": stand.wfp.calls["REMOVE"] - removed_before,
+        "start_during_sweep_ms": percentiles(starts),
+    }
+
+SCENARIOS = {"burst": scenario_burst, "taps": scenario_taps, "checkout": scenario_checkout, "expiry": scenario_expiry}
+
+async def main(args):
+    stand = Stand(args)
+    await stand.start()
+    lag = LoopLag()
+    lag.start()
+    try:
+        results = {}
+        for name in args.scenarios:
+            results[name] = await SCENARIOS[name](stand, args)
+            # Память и база растут по ходу: снимок после каждого сценария
+            results[name]["max_rss_bytes"] = rss_bytes()
+            results[name]["db_size_bytes"] = db_size(stand.db_path)
+    finally:
+        results_lag = await lag.stop()
+        await stand.stop()
+    results["loop_lag_ms"] = results_lag
+    results["max_rss_bytes"] = rss_bytes()
+    results["db_size_bytes"] = db_size(stand.db_path)
+    results["telegram_calls"] = dict(stand.tg.calls)
+    write_result(args.name, {k: v for k, v in vars(args).items() if k != "name"}, results, args.out)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["burst"], choices=sorted(SCENARIOS))
+    parser.add_argument("--users", type=int, default=300, help="/start от стольких пользователей")
+    parser.add_argument("--webhooks", type=int, default=300, help="одобренных оплат")
+    parser.add_argument("--expired", type=int, default=2000, help="истекших подписок для сценария expiry")
+    parser.add_argument("--sweep-starts", type=int, default=200, help="/start во время прохода (expiry)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tg-rate", type=float, default=1000, help="TG_GLOBAL_RATE бота на стенде")
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="задержка заглушки Telegram, сек")
+    parser.add_argument("--wfp-latency", type=float, default=0.0, help="задержка заглушки WayForPay, сек")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--blocking-db", action="store_true", help="синхронная запись в SQLite на каждый запрос")
+    parser.add_argument("--name", default="load")
+    parser.add_argument("--out", default=None, help="каталог отчетов, по умолчанию bench/results")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
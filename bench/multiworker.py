@@ -0,0 +1,150 @@
+""" Несколько процессов бота за одним портом (SO_REUSEPORT) на общей базе.
+
+Для каждого числа воркеров: свежая база с истекшими подписками и прерванным проходом (так
+проход стартует сразу во всех воркерах), поток /start через вебхук Telegram и подсчет банов
+в заглушке. Каждый пользователь должен быть забанен ровно один раз, сколько бы воркеров ни было.
+Рост пропускной способности (scaling) виден только при cpu_count > 1: на одном ядре воркеры делят его.
+
+    python bench/multiworker.py --workers 1 2 4 --updates 2000 --expired 300
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from common import bounded, free_port, load_bot, percentiles, write_result
+from load import SECRET, message_update
+from stubs import FakeTelegram, serve
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WEBHOOK_PATH = "/telegram/webhook"
+
+async def seed(expired):
+    """ Истекшие подписки и прерванный проход: _first_run запустит его сразу после старта """
+    bot = load_bot()
+    await bot.init_db()
+    async with bot.get_session() as session:
+        past = datetime.now() - timedelta(hours=1)
+        session.add_all(bot.User(telegram_id=uid, is_active=True, tariff="T", start_date=past - timedelta(days=30),
+                                 expiry_date=past, version=1)
+                        for uid in range(1, expired + 1))
+        session.add(bot.JobState(name="check_subs", phase="revoke", cursor=0, updated_at=datetime.now()))
+        await session.commit()
+    await bot.engine.dispose()
+
+async def run_workers(args, count, tg, tg_port):
+    workdir = tempfile.mkdtemp(prefix=f"bench-mw{count}-")
+    app_port = free_port()
+    env = {
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "BOT_MODE": "webhook", "TG_WEBHOOK_SECRET": SECRET, "TG_WEBHOOK_PATH": WEBHOOK_PATH,
+        "TG_API_URL": f"http://127.0.0.1:{tg_port}",
+        "BASE_WEBHOOK_URL": f"http://127.0.0.1:{app_port}", "PORT": str(app_port), "WEB_REUSE_PORT": "1",
+        "TG_GLOBAL_RATE": str(args.tg_rate), "SWEEP_CONCURRENCY": "20",
+    }
+    # bot.py читает DATABASE_URL при импорте, поэтому базу наполняет отдельный процесс
+    subprocess.run([sys.executable, os.path.join(HERE, "multiworker.py"), "--seed", str(args.expired)],
+                   env={**os.environ, **env}, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    tg.calls.clear()
+    tg.banned.clear()
+    # Логи воркеров - рядом с базой, чтобы было что смотреть, если прогон не удался
+    logs = [open(os.path.join(workdir, f"w{i}.log"), "wb") for i in range(count)]
+    procs = [subprocess.Popen([sys.executable, os.path.join(HERE, "multiworker.py"), "--serve"],
+                              env={**os.environ, **env, "WORKER_ID": f"w{i}"},
+                              stdout=log, stderr=subprocess.STDOUT)
+             for i, log in enumerate(logs)]
+    try:
+        # Каждый воркер на старте ставит вебхук (setWebhook) - так понятно, что поднялись все
+        deadline = time.monotonic() + args.startup_timeout
+        while tg.calls["setWebhook"] < count:
+            if time.monotonic() > deadline: raise RuntimeError(f"воркеры не поднялись, логи в {workdir}")
+            await asyncio.sleep(0.1)
+        # setWebhook приходит из on_startup, порт начинают слушать чуть позже
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", app_port)
+                writer.close()
+                break
+            except OSError:
+                if time.monotonic() > deadline: raise RuntimeError(f"воркеры не поднялись, логи в {workdir}")
+                await asyncio.sleep(0.1)
+
+        base = f"http://127.0.0.1:{app_port}"
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as http:
+            async def one(i):
+                uid = 1_000_000 + i
+                reply = tg.wait_message(uid)
+                started = time.perf_counter()
+                async with http.post(base + WEBHOOK_PATH, json=message_update(i + 1, uid, "/start"),
+                                     headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+                    resp.raise_for_status()
+                return await asyncio.wait_for(reply, args.timeout) - started
+            started = time.perf_counter()
+            latencies = await bounded([one(i) for i in range(args.updates)], args.concurrency)
+            elapsed = time.perf_counter() - started
+
+        # Проход мог еще идти: ждем, пока забанят всех истекших
+        deadline = time.monotonic() + args.timeout
+        while len(tg.banned) < args.expired and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+    finally:
+        for p in procs:
+            p.send_signal(signal.SIGTERM)
+        for p in procs:
+            try:
+                p.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        for log in logs:
+            log.close()
+
+    return {
+        "updates_per_sec": round(args.updates / elapsed, 1),
+        "start_reply_ms": percentiles(latencies),
+        "users_banned": len(tg.banned),
+        "duplicate_bans": sum(n - 1 for n in tg.banned.values()),
+        "sweep_complete": len(tg.banned) == args.expired,
+    }
+
+async def main(args):
+    tg = FakeTelegram(latency=args.tg_latency)
+    tg_port = free_port()
+    runner = await serve(tg.app(), tg_port)
+    results = {}
+    try:
+        for count in args.workers:
+            results[f"workers_{count}"] = await run_workers(args, count, tg, tg_port)
+    finally:
+        await runner.cleanup()
+    base = results[f"workers_{args.workers[0]}"]["updates_per_sec"]
+    results["scaling"] = {k: round(v["updates_per_sec"] / base, 2) for k, v in results.items()}
+    results["cpu_count"] = os.cpu_count()
+    write_result("multiworker", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        # Один воркер: обычный боевой запуск с окружением от родителя
+        load_bot().main()
+        sys.exit(0)
+    if sys.argv[1:2] == ["--seed"]:
+        asyncio.run(seed(int(sys.argv[2])))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--expired", type=int, default=200, help="истекших подписок для проверки задвоения")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tg-rate", type=float, default=1000)
+    parser.add_argument("--tg-latency", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+""" Полная сверка с WayForPay (reconcile_job) на --users подписках с автоплатежом.
+
+В отличие от тестов, fetch_wfp_status настоящий: запрос STATUS с merchantPassword идет через
+WayForPayClient в заглушку regularApi, которая проверяет подпись. Ответы заглушки: ~10% Removed
+(отмена), ~30% Active с датой списания позже нашей (продление), остальные без изменений.
+Второй проход сразу за первым должен целиком взять ответы из кэша, не обращаясь к WFP.
+
+    python bench/reconcile.py --users 20000 --concurrency 20 --wfp-latency 0.05
+"""
+import argparse
+import asyncio
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from common import db_size, free_port, load_bot, rss_bytes, write_result
+from stubs import FakeWayForPay, serve
+
+BASE_UID = 3_000_000
+PAID_UNTIL = int(time.time()) + 60 * 86400
+
+def outcome(order_ref):
+    bucket = zlib.crc32(order_ref.encode()) % 10
+    return "cancel" if bucket == 0 else "extend" if bucket <= 3 else "keep"
+
+def status_for(order_ref):
+    kind = outcome(order_ref)
+    if kind == "cancel":
+        return {"status": "Removed"}
+    # keep: следующее списание раньше нашего срока - менять нечего
+    return {"status": "Active", "nextPaymentDate": PAID_UNTIL if kind == "extend" else int(time.time()) + 86400}
+
+def seed(path, users):
+    now = datetime.now()
+    def ts(moment):
+        return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, tariff, start_date, expiry_date, is_active, active_order_ref, "
+            "reminder_sent, blocked_bot, version, updated_at) VALUES (?, 'T', ?, ?, 1, ?, 0, 0, 1, ?)",
+            ((BASE_UID + i, ts(now - timedelta(days=20)), ts(now + timedelta(days=10)), f"SUB_{BASE_UID + i}_1_r",
+              ts(now)) for i in range(users)))
+    conn.close()
+
+async def main(args):
+    stub = FakeWayForPay(latency=args.wfp_latency, status_for=status_for, secret="bench-secret")
+    port = free_port()
+    runner = await serve(stub.app(), port)
+    bot = load_bot(tempfile.mkdtemp(prefix="bench-reconcile-"), MERCHANT_SECRET="bench-secret",
+                   WFP_API_URL=f"http://127.0.0.1:{port}/regularApi", RECONCILE_CONCURRENCY=args.concurrency)
+    await bot.init_db()
+    await bot.engine.dispose()
+    seed(bot.engine.url.database, args.users)
+    expected = {kind: sum(outcome(f"SUB_{BASE_UID + i}_1_r") == kind for i in range(args.users))
+                for kind in ("cancel", "extend")}
+    results = {}
+    try:
+        for run in ("cold", "warm"):
+            calls = stub.calls["STATUS"]
+            started = time.perf_counter()
+            totals = await bot.reconcile_job()
+            elapsed = time.perf_counter() - started
+            results[run] = {**totals, "status_requests": stub.calls["STATUS"] - calls,
+                            "users_per_sec": round(totals["checked"] / elapsed, 1)}
+    finally:
+        await bot.wfp.close()
+        await bot.engine.dispose()
+        await runner.cleanup()
+    results["matches_stub"] = (results["cold"]["cancelled"] == expected["cancel"]
+                               and results["cold"]["extended"] == expected["extend"])
+    results["bad_signatures"] = stub.calls["bad_signature"]
+    results["status_cache_entries"] = len(bot._wfp_status_cache)
+    results["db_bytes"] = db_size(bot.engine.url.database)
+    results["rss_bytes"] = rss_bytes()
+    write_result("reconcile", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=20, help="RECONCILE_CONCURRENCY")
+    parser.add_argument("--wfp-latency", type=float, default=0.0, help="задержка заглушки, сек")
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
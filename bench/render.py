@@ -0,0 +1,95 @@
+""" Микробенчмарк ответа на нажатие: клавиатура и текст, собранные заново на каждое сообщение
+(как было до RenderCache), против заранее собранных. Меряется и полный путь до тела запроса:
+SendMessage + build_form_data сессии aiogram (model_dump и JSON разметки).
+
+    python bench/render.py --number 20000
+"""
+import argparse
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from aiogram.methods import SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+
+from common import load_bot, write_result
+
+# Так клавиатуры и профиль строились до RenderCache - база для сравнения
+def legacy_main_keyboard():
+    kb = [
+        [KeyboardButton(text="👤 Профиль / Статус"), KeyboardButton(text="💳 Купить подписку")],
+        [KeyboardButton(text="🆘 Поддержка")]
+    ]
+    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
+
+def legacy_tariffs_keyboard(tariffs):
+    kb = []
+    for key, data in tariffs.items():
+        kb.append([InlineKeyboardButton(text=f"{data['name']} - {data['price']} UAH", callback_data=f"buy_{key}")])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+def legacy_profile_keyboard():
+    kb = [[InlineKeyboardButton(text="❌ Отменить автопродление", callback_data="cancel_sub")]]
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+def legacy_profile_text(user):
+    status = "✅ АКТИВНА"
+    date_str = user.expiry_date.strftime('%d.%m.%Y')
+    return (
+        f"👤 <b>Ваш профиль</b>\n\n"
+        f"Статус подписки: {status}\n"
+        f"Истекает: {date_str}\n"
+        f"Тариф: {user.tariff}\n\n"
+        f"🔗 Ваша ссылка: {user.invite_link or 'Нет'}"
+    )
+
+def per_op(fn, number, repeat):
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return {"ops_per_sec": round(number / best), "us_per_op": round(best / number * 1e6, 2)}
+
+def main(args):
+    bot = load_bot(tempfile.mkdtemp(prefix="bench-render-"))
+    # Тарифов столько, сколько попросили: длина клавиатуры - главный множитель стоимости
+    bot.TARIFFS.clear()
+    bot.TARIFFS.update({f"t{i}": {"name": f"Тариф {i}", "price": 100 + i, "days": 30, "period": "monthly"}
+                        for i in range(args.tariffs)})
+    bot.render.rebuild()
+    session, tg = bot.bot.session, bot.bot
+    user = SimpleNamespace(expiry_date=datetime.now() + timedelta(days=30), tariff="Тариф 1",
+                           invite_link="https://t.me/+abcdef123456")
+
+    def send(text, markup):
+        # То, что делает aiogram перед отправкой каждого сообщения
+        return session.build_form_data(tg, SendMessage(chat_id=123456789, text=text, reply_markup=markup))
+
+    cases = {
+        "main_keyboard": (legacy_main_keyboard, bot.get_main_keyboard, bot.START_TEXT),
+        "tariffs_keyboard": (lambda: legacy_tariffs_keyboard(bot.TARIFFS), bot.get_tariffs_keyboard,
+                             bot.CHOOSE_TARIFF_TEXT),
+        "profile_keyboard": (legacy_profile_keyboard, lambda: bot.get_profile_keyboard(1), None),
+    }
+    n, r = args.number, args.repeat
+    results = {}
+    for name, (legacy, cached, text) in cases.items():
+        text = text or legacy_profile_text(user)
+        assert legacy().model_dump() == cached().model_dump()
+        before = {"build": per_op(legacy, n, r), "build_and_serialize": per_op(lambda: send(text, legacy()), n, r)}
+        after = {"build": per_op(cached, n, r), "build_and_serialize": per_op(lambda: send(text, cached()), n, r)}
+        results[name] = {"before": before, "after": after, "speedup": round(
+            after["build_and_serialize"]["ops_per_sec"] / before["build_and_serialize"]["ops_per_sec"], 2)}
+
+    profile_template = lambda: bot.PROFILE_ACTIVE_TEMPLATE(expiry=user.expiry_date, tariff=user.tariff,
+                                                            link=user.invite_link or 'Нет')
+    assert profile_template() == legacy_profile_text(user)
+    results["profile_text"] = {"before": per_op(lambda: legacy_profile_text(user), n, r),
+                               "after": per_op(profile_template, n, r)}
+    write_result("render", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tariffs", type=int, default=4)
+    parser.add_argument("--out", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,49 @@
+""" Микробенчмарк подписи WayForPay: hmac.new на каждое сообщение (как было) против копии
+заранее подготовленного состояния (WayForPaySigner), и проверка колбэков.
+
+    python bench/signature.py --number 200000
+"""
+import argparse
+import hashlib
+import hmac
+import tempfile
+import timeit
+
+from common import load_bot, write_result
+
+def per_sec(fn, number, repeat):
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return {"ops_per_sec": round(number / best), "ns_per_op": round(best / number * 1e9, 1)}
+
+def main(args):
+    bot = load_bot(tempfile.mkdtemp(prefix="bench-sig-"))
+    secret = bot.MERCHANT_SECRET
+    text = f"{bot.MERCHANT_ACCOUNT};SUB_123456789_1700000000_ab12cd34;1;UAH;541963;41****8217;Approved;1100"
+    data = {"merchantAccount": bot.MERCHANT_ACCOUNT, "orderReference": "SUB_123456789_1700000000_ab12cd34",
+            "amount": "1", "currency": "UAH", "authCode": "541963", "cardPan": "41****8217",
+            "transactionStatus": "Approved", "reasonCode": 1100}
+    valid = {**data, "merchantSignature": bot.signer.sign_fields(data[f] for f in bot.WayForPaySigner.CALLBACK_FIELDS)}
+    forged = {**valid, "amount": "1000"}
+    unsigned = dict(data)
+
+    def fresh_hmac():
+        return hmac.new(secret.encode("utf-8"), text.encode("utf-8"), hashlib.md5).hexdigest()
+
+    n, r = args.number, args.repeat
+    results = {
+        "sign_fresh_hmac": per_sec(fresh_hmac, n, r),
+        "sign_prekeyed": per_sec(lambda: bot.signer.sign(text), n, r),
+        "verify_valid": per_sec(lambda: bot.signer.verify_callback(valid), n, r),
+        "verify_forged": per_sec(lambda: bot.signer.verify_callback(forged), n, r),
+        "verify_unsigned": per_sec(lambda: bot.signer.verify_callback(unsigned), n, r),
+    }
+    results["sign_speedup"] = round(results["sign_prekeyed"]["ops_per_sec"]
+                                    / results["sign_fresh_hmac"]["ops_per_sec"], 2)
+    write_result("signature", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,166 @@
+""" Конкурентные чтение и запись SQLite на 100k пользователей: WAL против rollback-журнала,
+с индексами миграции 3 и без них.
+
+Каждый вариант - отдельный процесс со своей базой: bot.py читает DATABASE_URL при импорте,
+а режим журнала задается на соединение. Читатели гоняют запросы горячего пути
+(профиль по telegram_id, окна напоминаний и истекших из прохода, пачку сверки WFP),
+писатели - продления через _grant_db. Все идет через движок и пул bot.py.
+
+    python bench/sqlite_100k.py --users 100000 --seconds 10 --readers 8 --writers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from common import load_bot, percentiles, rss_bytes, write_result
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VARIANTS = {
+    # имя: (journal_mode, synchronous, оставить индексы)
+    "wal_indexed": ("WAL", "NORMAL", True),
+    "wal_no_indexes": ("WAL", "NORMAL", False),
+    "rollback_indexed": ("DELETE", "FULL", True),
+    "rollback_no_indexes": ("DELETE", "FULL", False),
+}
+
+def seed(path, users):
+    """ Сырой executemany: 100k строк за секунды. Доли как в живой базе: большинство активны,
+    у части уже истек срок, у части подходит окно напоминания, у половины есть регулярный платеж """
+    now = datetime.now()
+    rnd = random.Random(42)
+    def ts(moment):
+        # Формат, в котором DateTime хранит SQLAlchemy: иначе сравнения строк в SQLite врут
+        return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+    def row(i):
+        expiry = now + timedelta(days=rnd.uniform(-60, 60))
+        active = expiry > now or rnd.random() < 0.05
+        return (1_000_000 + i, "Тариф", ts(now - timedelta(days=30)), ts(expiry), active,
+                f"SUB_{i}" if active and rnd.random() < 0.5 else None, False, False, 1, ts(now))
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, tariff, start_date, expiry_date, is_active, active_order_ref, "
+            "reminder_sent, blocked_bot, version, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row(i) for i in range(users)))
+    conn.execute("ANALYZE")
+    conn.close()
+
+async def run_variant(name, args):
+    journal, synchronous, indexed = VARIANTS[name]
+    bot = load_bot()
+    path = bot.engine.url.database
+    # Вместо WAL/NORMAL из bot.py - режим варианта; busy_timeout тот же, иначе меряли бы ошибки
+    event.remove(bot.engine.sync_engine, "connect", bot._tune_sqlite)
+    @event.listens_for(bot.engine.sync_engine, "connect")
+    def tune(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={bot.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    await bot.init_db()
+    if not indexed:
+        async with bot.engine.begin() as conn:
+            for table in bot.Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    if not index.unique: await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    await bot.engine.dispose()
+    seed(path, args.users)
+
+    User = bot.User
+    now = datetime.now()
+    windows = {
+        "remind_window": (User.reminder_sent == False, User.blocked_bot.isnot(True),
+                          User.expiry_date >= now + timedelta(days=bot.REMINDER_DAYS),
+                          User.expiry_date < now + timedelta(days=bot.REMINDER_DAYS + 1)),
+        "expired_window": (User.expiry_date < now,),
+        "reconcile_chunk": (User.active_order_ref != None,),
+    }
+    latencies, errors = defaultdict(list), defaultdict(int)
+    deadline = time.monotonic() + args.seconds
+    rnd = random.Random()
+
+    async def timed(op, coro_fn):
+        started = time.perf_counter()
+        try:
+            await coro_fn()
+            latencies[op].append(time.perf_counter() - started)
+        except OperationalError:  # database is locked - busy_timeout не хватило
+            errors[op] += 1
+
+    async def profile():
+        async with bot.get_session() as session:
+            await bot.get_user(session, 1_000_000 + rnd.randrange(args.users))
+
+    def first_chunk(criteria):
+        async def read():
+            async for _ in bot._iter_due_users(*criteria): break
+        return read
+
+    async def grant():
+        async with bot.get_session() as session:
+            await bot._grant_db(session, 1_000_000 + rnd.randrange(args.users), 30, "Тариф")
+            await session.commit()
+
+    async def reader():
+        ops = [("profile", profile)] * 3 + [(op, first_chunk(c)) for op, c in windows.items()]
+        while time.monotonic() < deadline:
+            await timed(*rnd.choice(ops))
+
+    async def writer():
+        while time.monotonic() < deadline:
+            await timed("grant", grant)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[reader() for _ in range(args.readers)], *[writer() for _ in range(args.writers)])
+    elapsed = time.perf_counter() - started
+    await bot.engine.dispose()
+    return {
+        "ops": {op: {"ops_per_sec": round(len(v) / elapsed, 1), "latency_ms": percentiles(v)}
+                for op, v in sorted(latencies.items())},
+        "reads_per_sec": round(sum(len(v) for op, v in latencies.items() if op != "grant") / elapsed, 1),
+        "writes_per_sec": round(len(latencies["grant"]) / elapsed, 1),
+        "locked_errors": dict(errors),
+        "db_bytes": sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)),
+        "rss_bytes": rss_bytes(),
+    }
+
+def main(args):
+    results = {}
+    for name in args.variants:
+        workdir = tempfile.mkdtemp(prefix=f"bench-sqlite-{name}-")
+        env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"}
+        proc = subprocess.run([sys.executable, os.path.join(HERE, "sqlite_100k.py"), "--variant", name,
+                               *sys.argv[1:]], env=env, check=True, capture_output=True, text=True)
+        results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{name}: reads {results[name]['reads_per_sec']}/s, writes {results[name]['writes_per_sec']}/s")
+    write_result("sqlite_100k", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--variant", choices=list(VARIANTS), help=argparse.SUPPRESS)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    if args.variant:
+        # Дочерний процесс: один вариант, результат - последней строкой stdout
+        print(json.dumps(asyncio.run(run_variant(args.variant, args))))
+    else:
+        main(args)
@@ -0,0 +1,117 @@
+""" Локальные заглушки Telegram Bot API и WayForPay для стенда """
+import asyncio
+import hashlib
+import hmac
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+async def serve(app, port):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+class FakeTelegram:
+    """ Bot API на /bot<token>/<method>: отвечает успехом и запоминает, кому и когда писал бот """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.banned = Counter()  # user_id -> сколько раз забанили: повторы = задвоенная работа
+        self._seq = 0
+        self._waiters = defaultdict(list)  # chat_id -> [Future], будятся следующим сообщением в чат
+
+    def app(self):
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    def wait_message(self, chat_id):
+        """ Future, которая завершится временем прихода следующего sendMessage в этот чат """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[int(chat_id)].append(future)
+        return future
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "getUpdates":
+            await asyncio.sleep(1)
+            return self._ok([])
+        return self._ok(self._result(method, params))
+
+    def _result(self, method, params):
+        if method == "banChatMember":
+            self.banned[int(params["user_id"])] += 1
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            for future in self._waiters.pop(chat_id, []):
+                if not future.done(): future.set_result(time.perf_counter())
+            self._seq += 1
+            return {"message_id": self._seq, "date": int(time.time()), "text": params.get("text", ""),
+                    "chat": {"id": chat_id, "type": "private"}}
+        if method in ("createChatInviteLink", "revokeChatInviteLink"):
+            self._seq += 1
+            return {"invite_link": params.get("invite_link") or f"https://t.me/+bench{self._seq}",
+                    "creator": {"id": 1, "is_bot": True, "first_name": "bench"},
+                    "creates_join_request": False, "is_primary": False,
+                    "is_revoked": method == "revokeChatInviteLink"}
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        return True
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+class FakeWayForPay:
+    """ Purchase (/pay) и regularApi (/regularApi). status_for(order_ref) задает ответ STATUS.
+    С secret заглушка, как настоящий regularApi, проверяет merchantPassword и отвечает 1113 на чужой """
+    def __init__(self, latency=0.0, status_for=None, secret=None):
+        self.latency = latency
+        self.secret = secret
+        self.status_for = status_for or (lambda ref: {"status": "Active",
+                                                     "nextPaymentDate": int(time.time()) + 30 * 86400})
+        self.calls = Counter()
+        self.orders = {}  # telegram_id -> (orderReference, amount) последнего счета
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/pay", self.handle_pay)
+        app.router.add_post("/regularApi", self.handle_regular)
+        return app
+
+    async def handle_pay(self, request):
+        self.calls["pay"] += 1
+        form = await request.post()
+        order_ref = form.get("orderReference", "")
+        if order_ref.startswith("SUB_"):
+            self.orders[int(order_ref.split("_")[1])] = (order_ref, form.get("amount"))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"url": f"https://secure.wayforpay.local/pay/{form.get('orderReference')}"})
+
+    async def handle_regular(self, request):
+        data = await request.json()
+        kind = data.get("requestType")
+        self.calls[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.secret is not None:
+            signed = f"{data.get('merchantAccount')};{data.get('orderReference')}"
+            expected = hmac.new(self.secret.encode(), signed.encode(), hashlib.md5).hexdigest()
+            if not hmac.compare_digest(str(data.get("merchantPassword", "")), expected):
+                self.calls["bad_signature"] += 1
+                return web.json_response({"reasonCode": 1113, "reason": "Wrong signature"})
+        if kind == "STATUS":
+            return web.json_response({"reasonCode": 4100, "reason": "Ok", **self.status_for(data["orderReference"])})
+        return web.json_response({"reasonCode": 4100, "reason": "Ok"})
@@ -0,0 +1,71 @@
+""" Создание счетов через заглушку WayForPay: общий пул соединений (WayForPayClient) против
+новой aiohttp-сессии на каждый вызов, как было до пула.
+
+Заглушка работает по http на localhost, поэтому разница - только TCP-подключение и сессия;
+с TLS до secure.wayforpay.com каждый новый вызов платит еще и рукопожатие.
+
+    python bench/wfp_pool.py --invoices 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import aiohttp
+
+from common import bounded, free_port, load_bot, percentiles, write_result
+from stubs import FakeWayForPay, serve
+
+class PerCallClient:
+    """ Прежнее поведение: aiohttp.ClientSession на каждый запрос """
+    def __init__(self, timeout):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def post(self, url, **kwargs):
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            async with session.post(url, **kwargs) as response:
+                return json.loads(await response.text())
+
+async def measure(bot, client, args, offset):
+    bot.wfp = client
+    tariff = bot.TARIFFS["1_month"]
+    async def one(i):
+        started = time.perf_counter()
+        url, _ = await bot.create_invoice(offset + i, "1_month", tariff)
+        assert url, "заглушка не вернула url"
+        return time.perf_counter() - started
+    started = time.perf_counter()
+    latencies = await bounded([one(i) for i in range(args.invoices)], args.concurrency)
+    elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 3), "invoices_per_sec": round(args.invoices / elapsed, 1),
+            "latency_ms": percentiles(latencies)}
+
+async def main(args):
+    stub = FakeWayForPay(latency=args.wfp_latency)
+    port = free_port()
+    runner = await serve(stub.app(), port)
+    bot = load_bot(tempfile.mkdtemp(prefix="bench-wfp-"), WFP_PAY_URL=f"http://127.0.0.1:{port}/pay")
+    await bot.init_db()
+    pooled = bot.WayForPayClient()
+    results = {}
+    try:
+        # Прогрев: пул и импорт не должны попасть в замер
+        await measure(bot, pooled, argparse.Namespace(invoices=10, concurrency=10), 10**9)
+        results["per_call_session"] = await measure(bot, PerCallClient(bot.WFP_TIMEOUT), args, 0)
+        results["pooled_client"] = await measure(bot, pooled, args, args.invoices)
+    finally:
+        await pooled.close()
+        await bot.engine.dispose()
+        await runner.cleanup()
+    results["speedup"] = round(results["pooled_client"]["invoices_per_sec"]
+                               / results["per_call_session"]["invoices_per_sec"], 2)
+    write_result("wfp_pool", vars(args), results, args.out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--wfp-latency", type=float, default=0.0, help="задержка заглушки, сек")
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
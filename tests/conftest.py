@@ -0,0 +1,90 @@
+""" bot.py читает настройки при импорте: окружение теста выставляем до него """
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ.setdefault("MERCHANT_ACCOUNT", "test_merch")
+os.environ.setdefault("MERCHANT_SECRET", "test-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot as B  # noqa: E402
+
+class FakeTelegram:
+    """ Подменяет методы Bot: запоминает вызовы, методы из fail бросают исключение """
+    METHODS = ("send_message", "ban_chat_member", "unban_chat_member",
+               "create_chat_invite_link", "revoke_chat_invite_link")
+
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+        self.gate = None  # asyncio.Event: если задан, ban_chat_member ждет его
+
+    def method(self, name):
+        async def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            if name == "ban_chat_member" and self.gate is not None:
+                await self.gate.wait()
+            if name in self.fail:
+                raise RuntimeError(f"{name} failed")
+            if name == "create_chat_invite_link":
+                return type("Invite", (), {"invite_link": f"https://t.me/+test{len(self.calls)}"})()
+            return True
+        return call
+
+    def called(self, name):
+        return [c for c in self.calls if c[0] == name]
+
+@pytest.fixture
+def tg(monkeypatch):
+    fake = FakeTelegram()
+    for name in FakeTelegram.METHODS:
+        monkeypatch.setattr(B.bot, name, fake.method(name))
+    return fake
+
+@pytest.fixture(autouse=True)
+def wfp_status(monkeypatch):
+    """ Ответы regularApi STATUS по order_ref; по умолчанию "ничего не менять". Тесты в сеть не ходят """
+    answers = {}
+    async def fetch(order_ref, max_age=None):
+        answer = answers.get(order_ref, {"reasonCode": 4100, "status": "Active"})
+        if isinstance(answer, Exception): raise answer
+        return answer
+    monkeypatch.setattr(B, "fetch_wfp_status", fetch)
+    return answers
+
+@pytest.fixture
+def wfp_cancels(monkeypatch):
+    cancelled = []
+    async def cancel(order_ref):
+        cancelled.append(order_ref)
+        return True
+    monkeypatch.setattr(B, "cancel_wfp_subscription", cancel)
+    return cancelled
+
+@pytest.fixture
+def run():
+    """ Запуск корутины теста на чистой базе, со своими очередями и без лимитов Telegram """
+    def runner(coro_fn):
+        async def wrapper():
+            B.outbox = B.TelegramOutbox(B.bot, rate=100000, chat_interval=0)
+            B.outbox.start()
+            B.payment_queue = asyncio.Queue()
+            B.payment_inbox = B.PaymentInbox()
+            B._payment_retries.clear()
+            B.subscribers = B.SubscriberCache()
+            async with B.engine.begin() as conn:
+                await conn.run_sync(B.Base.metadata.drop_all)
+            await B.init_db()
+            try:
+                return await coro_fn()
+            finally:
+                await B.outbox.stop()
+                await B.wfp.close()
+                await B.engine.dispose()
+        return asyncio.run(wrapper())
+    return runner
@@ -0,0 +1,38 @@
+""" Процесс-воркер для test_job_lock: проход по подпискам под общей блокировкой на общей базе.
+Печатает JSON: запускал ли он проход и кого забанил """
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bot as B  # noqa: E402
+
+async def main(ban_delay):
+    banned = []
+    async def ban(chat_id, user_id, **kwargs):
+        await asyncio.sleep(ban_delay)
+        banned.append(user_id)
+        return True
+    async def ok(*args, **kwargs):
+        return True
+    async def cancel(order_ref):
+        return True
+    B.bot.ban_chat_member = ban
+    B.bot.send_message = B.bot.revoke_chat_invite_link = ok
+    B.cancel_wfp_subscription = cancel
+    B.outbox = B.TelegramOutbox(B.bot, rate=100000, chat_interval=0)
+    B.outbox.start()
+
+    # Импорт долгий: сообщаем о готовности и ждем общее время старта от теста
+    print("ready", flush=True)
+    start_at = float(await asyncio.to_thread(sys.stdin.readline))
+    await asyncio.sleep(max(start_at - time.time(), 0))
+    result = await B.singleton_job("check_subs", B.check_subs_job, B.JOB_LOCK_TTL)()
+    await B.outbox.stop()
+    await B.engine.dispose()
+    print(json.dumps({"worker": B.WORKER_ID, "ran": result is not None, "banned": banned}))
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1])))
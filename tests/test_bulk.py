@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from conftest import B
+
+def _progress(total):
+    async def edit_text(text):
+        pass
+    return B.BulkProgress(SimpleNamespace(edit_text=edit_text), "Выдача", total)
+
+def test_bulk_grant_reports_notify_failures(run, tg, monkeypatch):
+    invite = tg.method("create_chat_invite_link")
+    async def create_invite(**kwargs):
+        if kwargs["name"] == "U_2":
+            raise RuntimeError("chat not found")
+        return await invite(**kwargs)
+    monkeypatch.setattr(B.bot, "create_chat_invite_link", create_invite)
+    progress = _progress(3)
+    async def scenario():
+        await B.bulk_grant([1, 2, 3], 30, "T", progress)
+        async with B.get_session() as session:
+            return {u.telegram_id: u for u in await session.scalars(B.select(B.User))}
+    users = run(scenario)
+    assert progress.done == 3
+    assert [(uid, str(error)) for uid, error in progress.failures] == [(2, "invite: chat not found")]
+    # Доступ в базе выдан всем, ссылки нет только у того, кому не удалось ее создать
+    assert all(u.is_active for u in users.values())
+    assert users[2].invite_link is None and users[1].invite_link and users[3].invite_link
+
+def test_grant_notify_returns_none_on_success(run, tg):
+    async def scenario():
+        async with B.get_session() as session:
+            user = await B._grant_db(session, 7, 30, "T")
+            await session.commit()
+        return await B._grant_notify(user)
+    assert run(scenario) is None
+    assert tg.called("unban_chat_member") and tg.called("create_chat_invite_link")
+
+def test_bulk_revoke_claims_first_and_skips_unknown(run, tg, wfp_cancels, monkeypatch):
+    ban = tg.method("ban_chat_member")
+    async def ban_member(chat_id, user_id, **kwargs):
+        if user_id == 2:
+            raise RuntimeError("ban failed")
+        return await ban(chat_id, user_id, **kwargs)
+    monkeypatch.setattr(B.bot, "ban_chat_member", ban_member)
+    progress = _progress(4)
+    async def scenario():
+        for uid in (1, 2, 3):
+            await B.grant_access(uid, 30, "T", order_ref=f"SUB_{uid}")
+        await B.mark_blocked([3])
+        tg.calls.clear()
+        await B.bulk_revoke([1, 2, 3, 99], progress)
+        while not tg.called("send_message") or not B.outbox.queue.empty():
+            await asyncio.sleep(0.01)
+        async with B.get_session() as session:
+            users = {u.telegram_id: u for u in await session.scalars(B.select(B.User))}
+            revoked = set(await session.scalars(
+                B.select(B.SubscriptionEvent.telegram_id).where(B.SubscriptionEvent.kind == 'revoke')))
+        return users, revoked
+    users, revoked = run(scenario)
+    assert sorted((uid, str(error)) for uid, error in progress.failures) == [(2, "ban failed"), (99, "нет в базе")]
+    assert not users[1].is_active and not users[3].is_active
+    # Бан не прошел - доступ вернулся, отзыв повторит следующий проход
+    assert users[2].is_active and users[2].active_order_ref == "SUB_2"
+    assert 99 not in users and 99 not in revoked
+    # Заблокировавшему бота не пишем, неудачный бан - тоже без уведомления
+    assert [c[1][0] for c in tg.called("send_message")] == [1]
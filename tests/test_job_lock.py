@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from conftest import B
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lock_worker.py")
+
+async def _expired_users(count):
+    async with B.get_session() as session:
+        for uid in range(1, count + 1):
+            user = await B._grant_db(session, uid, 1, "T")
+            user.expiry_date = datetime.now() - timedelta(hours=1)
+        await session.commit()
+
+async def _lock():
+    async with B.get_session() as session:
+        return await session.get(B.JobLock, "check_subs")
+
+def test_sweep_renews_lease_after_each_chunk(run, tg, monkeypatch):
+    monkeypatch.setattr(B, "SWEEP_CHUNK_SIZE", 2)
+    expiries = []
+    save = B.save_job_state
+    async def spy(name, **values):
+        await save(name, **values)
+        if "cursor" in values and (lock := await _lock()):
+            expiries.append(lock.expires_at)
+    monkeypatch.setattr(B, "save_job_state", spy)
+    async def scenario():
+        await _expired_users(6)
+        return await B.singleton_job("check_subs", B.check_subs_job, B.JOB_LOCK_TTL)()
+    stats = run(scenario)
+    assert stats["revoked"] == 6
+    assert len(expiries) >= 3 and expiries == sorted(expiries) and expiries[-1] > expiries[0]
+
+def test_sweep_stops_when_lease_is_taken_over(run, tg, monkeypatch):
+    monkeypatch.setattr(B, "SWEEP_CHUNK_SIZE", 2)
+    revoke_chunk = B._revoke_chunk
+    async def steal_after_first_chunk(rows, stats, now):
+        await revoke_chunk(rows, stats, now)
+        async with B.get_session() as session:
+            # Аренда истекла, блокировку забрал другой воркер
+            lock = await session.get(B.JobLock, "check_subs")
+            lock.owner, lock.expires_at = "other-worker", datetime.now() + timedelta(minutes=10)
+            await session.commit()
+    monkeypatch.setattr(B, "_revoke_chunk", steal_after_first_chunk)
+    async def scenario():
+        await _expired_users(6)
+        stats = await B.singleton_job("check_subs", B.check_subs_job, B.JOB_LOCK_TTL)()
+        return stats, await _lock()
+    stats, lock = run(scenario)
+    assert stats["revoked"] == 2 and stats["lock_lost"] == "revoke@2"
+    assert lock.owner == "other-worker"  # release_lock не снял чужую блокировку
+
+def test_workers_do_not_duplicate_sweep(run, tmp_path):
+    """ Несколько процессов на одной базе стартуют проход одновременно и вразнобой.
+    TTL короче всего прохода: без продления аренды второй воркер повторил бы отзывы """
+    users, workers = 40, 3
+    async def seed():
+        await _expired_users(users)
+    run(seed)
+    env = {**os.environ, "JOB_LOCK_TTL": "1", "SWEEP_CHUNK_SIZE": "5", "SWEEP_CONCURRENCY": "5"}
+    procs = [
+        subprocess.Popen([sys.executable, WORKER, "0.3"], env={**env, "WORKER_ID": f"w{i}"}, text=True,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        for i in range(workers)
+    ]
+    for p in procs:
+        assert p.stdout.readline().strip() == "ready"
+    # Первый стартует сразу, остальные - пока он еще идет (проход ~2.5 с при TTL 1 с)
+    start_at = time.time() + 0.2
+    for i, p in enumerate(procs):
+        p.stdin.write(f"{start_at + 0.4 * i}\n")
+        p.stdin.flush()
+    reports = [json.loads(p.communicate(timeout=120)[0].strip().splitlines()[-1]) for p in procs]
+    assert sum(r["ran"] for r in reports) == 1, reports
+    bans = Counter(uid for r in reports for uid in r["banned"])
+    assert sorted(bans) == list(range(1, users + 1))
+    assert set(bans.values()) == {1}, f"повторные баны: {bans}"
+
+    async def events():
+        async with B.get_session() as session:
+            rows = (await session.execute(
+                B.select(B.SubscriptionEvent.telegram_id, B.func.count())
+                .where(B.SubscriptionEvent.kind == 'revoke').group_by(B.SubscriptionEvent.telegram_id)
+            )).all()
+        await B.engine.dispose()
+        return dict(rows)
+    assert set(asyncio.run(events()).values()) == {1}
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from conftest import B
+from test_signature import _post, callback, raw_body, signed
+
+def test_label_values_are_escaped():
+    m = B.Metrics()
+    m.inc("x_total", reason='bad "quote"\\path\nnext')
+    m.observe("y_seconds", 0.002, phase='a"b')
+    text = m.render()
+    assert 'x_total{reason="bad \\"quote\\"\\\\path\\nnext"} 1' in text
+    assert 'y_seconds_count{phase="a\\"b"} 1' in text
+    # Значения не рвут строку: каждая серия ровно на одной строке
+    assert all(line.count("{") <= 1 for line in text.splitlines())
+
+def test_unknown_webhook_status_is_counted_as_other(run, monkeypatch):
+    monkeypatch.setattr(B, "metrics", B.Metrics())
+    for status in ("Approved", "Declined", "x" * 50, "Approved\n# HELP"):
+        body = raw_body(signed(callback(transactionStatus=status, processingDate=len(status))))
+        assert run(lambda: _post(body))[0] == 200
+    counts = {dict(labels)["status"]: n for (name, labels), n in B.metrics.counters.items()
+              if name == "wfp_webhook_total"}
+    assert counts == {"Approved": 1, "Declined": 1, "other": 2}
+
+def _admin_message(text, answers):
+    async def answer(reply, **kwargs):
+        answers.append(reply)
+    return SimpleNamespace(text=text, from_user=SimpleNamespace(id=B.ADMIN_ID), answer=answer)
+
+def test_profile_start_rejects_bad_interval(run, monkeypatch):
+    started = []
+    monkeypatch.setattr(B.profiler, "available", lambda: True)
+    monkeypatch.setattr(B.profiler, "start", started.append)
+    answers = []
+    for text in ("/profile start abc", "/profile start 0", "/profile start -5"):
+        run(lambda: B.cmd_profile(_admin_message(text, answers)))
+    assert not started and len(answers) == 3 and all("/profile start 5" in a for a in answers)
+    run(lambda: B.cmd_profile(_admin_message("/profile start 10", answers)))
+    assert started == [0.01]
+
+def test_admin_errors_quote_arguments_without_markdown(run):
+    replies = []
+    def message(text):
+        async def answer(reply, **kwargs):
+            replies.append((reply, kwargs.get("parse_mode")))
+        return SimpleNamespace(text=text, from_user=SimpleNamespace(id=B.ADMIN_ID), answer=answer)
+    # Одиночное "_" в аргументе: с parse_mode="Markdown" Telegram вернул бы 400
+    run(lambda: B.cmd_export(message("/export bad_arg")))
+    run(lambda: B.cmd_broadcast(message("/broadcast odd_key\nТекст")))
+    assert [mode for _, mode in replies] == [None, None]
+    assert "bad_arg" in replies[0][0] and "odd_key" in replies[1][0]
@@ -0,0 +1,21 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+BOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+
+def test_workers_migrate_fresh_database_concurrently(tmp_path):
+    """ Воркеры стартуют разом на пустой базе: миграции применяются ровно один раз, никто не падает """
+    path = tmp_path / "fresh.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{path}"}
+    procs = [subprocess.Popen([sys.executable, BOT, "migrate"], env={**env, "WORKER_ID": f"w{i}"},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+             for i in range(4)]
+    errors = [p.communicate(timeout=120)[1] for p in procs]
+    assert [p.returncode for p in procs] == [0] * 4, errors
+    conn = sqlite3.connect(path)
+    versions = [v for (v,) in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    conn.close()
+    from conftest import B
+    assert versions == [version for version, _, _ in B.MIGRATIONS]
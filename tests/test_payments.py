@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import B
+from test_signature import _post, callback, raw_body, signed
+
+async def _pending_payment(uid, created_at=None):
+    async with B.get_session() as session:
+        payment = B.Payment(payment_key=f"SUB_{uid}_1_aa:Approved:1", order_reference=f"SUB_{uid}_1_aa",
+                            telegram_id=uid, amount=1, transaction_status="Approved", tariff="T", days=30,
+                            status='pending', created_at=created_at or datetime.now())
+        session.add(payment)
+        await session.commit()
+        return payment.id
+
+async def _status(payment_id):
+    async with B.get_session() as session:
+        return (await session.get(B.Payment, payment_id)).status
+
+async def _wait_applied(payment_id, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while await _status(payment_id) != 'applied':
+        assert asyncio.get_running_loop().time() < deadline, "платеж так и не применен"
+        await asyncio.sleep(0.02)
+
+def test_transient_error_is_retried(run, tg, monkeypatch):
+    monkeypatch.setattr(B, "PAYMENT_RETRY_DELAYS", (0, 0, 0))
+    grant_db = B._grant_db
+    failures = []
+    async def flaky(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise RuntimeError("database is locked")
+        return await grant_db(*args, **kwargs)
+    monkeypatch.setattr(B, "_grant_db", flaky)
+
+    async def scenario():
+        payment_id = await _pending_payment(7)
+        worker = asyncio.create_task(B.payment_worker())
+        try:
+            await _wait_applied(payment_id)
+        finally:
+            worker.cancel()
+        async with B.get_session() as session:
+            return await B.get_user(session, 7)
+    user = run(scenario)
+    assert len(failures) == 2
+    assert user.is_active
+
+def test_rescan_requeues_only_old_pending(run):
+    async def scenario():
+        old = await _pending_payment(1, created_at=datetime.now() - timedelta(minutes=10))
+        await _pending_payment(2)
+        await B.requeue_pending_payments()
+        return old, [B.payment_queue.get_nowait() for _ in range(B.payment_queue.qsize())]
+    old, queued = run(scenario)
+    assert queued == [old]
+
+def test_apply_payment_is_idempotent(run, tg):
+    async def scenario():
+        payment_id = await _pending_payment(3)
+        await asyncio.gather(B.apply_payment(payment_id), B.apply_payment(payment_id))
+        async with B.get_session() as session:
+            user = await B.get_user(session, 3)
+            events = (await session.scalars(select_events(3))).all()
+        return user, events
+    user, events = run(scenario)
+    assert len(events) == 1
+    assert user.expiry_date < datetime.now() + timedelta(days=31)
+
+def select_events(uid):
+    return B.select(B.SubscriptionEvent).where(B.SubscriptionEvent.telegram_id == uid)
+
+@pytest.mark.parametrize("amount,days,tariff", [(9, 365, "1 Год"), (7, 30, "Auto")])
+def test_legacy_renewal_without_invoice_matches_tariff_by_amount(run, amount, days, tariff):
+    async def scenario():
+        await B.load_tariffs()
+        # Регулярное списание по подписке, оформленной до таблицы счетов
+        ref = "SUB_42_1600000000_ab12cd34_WFPREG-3"
+        await _post(raw_body(signed(callback(orderReference=ref, amount=amount))))
+        async with B.get_session() as session:
+            return await session.scalar(B.select(B.Payment))
+    payment = run(scenario)
+    assert (payment.status, payment.days, payment.tariff) == ('pending', days, tariff)
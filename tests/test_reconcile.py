@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta
+
+from conftest import B
+
+FETCH_WFP_STATUS = B.fetch_wfp_status  # настоящий: autouse-фикстура wfp_status подменяет его в каждом тесте
+
+async def _subscribers(*order_refs):
+    for uid, ref in enumerate(order_refs, start=1):
+        await B.grant_access(uid, 1, "T", order_ref=ref)
+    async for rows in B._iter_due_users(B.User.active_order_ref != None):
+        return rows
+
+def test_bad_next_payment_date_fails_only_its_row(run, tg, wfp_status):
+    paid_until = int(time.time()) + 30 * 86400
+    wfp_status.update({
+        "SUB_1": {"reasonCode": 4100, "status": "Active", "nextPaymentDate": "tomorrow"},
+        "SUB_2": {"reasonCode": 4100, "status": "Active", "nextPaymentDate": 10 ** 20},
+        "SUB_3": {"reasonCode": 4100, "status": "Active", "nextPaymentDate": paid_until},
+        "SUB_4": {"reasonCode": 4100, "status": "Removed"},
+    })
+    async def scenario():
+        report = await B.reconcile_rows(await _subscribers("SUB_1", "SUB_2", "SUB_3", "SUB_4"))
+        async with B.get_session() as session:
+            return report, {u.telegram_id: u for u in await session.scalars(B.select(B.User))}
+    report, users = run(scenario)
+    assert (report["checked"], report["errors"], report["extended"], report["cancelled"]) == (4, 2, 1, 1)
+    assert users[3].expiry_date == datetime.fromtimestamp(paid_until)
+    assert users[4].active_order_ref is None
+    assert users[1].expiry_date < datetime.now() + timedelta(days=2)
+
+def test_reconcile_caches_snapshots_not_orm_rows(run, tg, wfp_status):
+    paid_until = int(time.time()) + 30 * 86400
+    wfp_status["SUB_1"] = {"reasonCode": 4100, "status": "Active", "nextPaymentDate": paid_until}
+    async def scenario():
+        await B.reconcile_rows(await _subscribers("SUB_1"))
+        return B.subscribers.get(1)
+    cached = run(scenario)
+    assert isinstance(cached, B.SubRecord)
+    assert cached.expiry_date == datetime.fromtimestamp(paid_until) and cached.is_active
+
+def test_status_cache_signs_requests_and_drops_stale_answers(run, monkeypatch):
+    monkeypatch.setattr(B, "fetch_wfp_status", FETCH_WFP_STATUS)
+    requests = []
+    async def post(url, **kwargs):
+        requests.append(kwargs["json"])
+        return {"reasonCode": 4100, "status": "Active"}
+    monkeypatch.setattr(B.wfp, "post", post)
+    stale_at = time.monotonic() - B.RECONCILE_CACHE_SECONDS - 1
+    monkeypatch.setattr(B, "_wfp_status_cache", {"SUB_OLD": (stale_at, {}), "SUB_OLDER": (stale_at, {})})
+    async def scenario():
+        await B.fetch_wfp_status("SUB_1")
+        await B.fetch_wfp_status("SUB_1")  # второй раз - из кэша
+    run(scenario)
+    assert [r["orderReference"] for r in requests] == ["SUB_1"]
+    assert requests[0]["merchantPassword"] == B.generate_signature(f"{B.MERCHANT_ACCOUNT};SUB_1")
+    assert list(B._wfp_status_cache) == ["SUB_1"]
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from conftest import B
+
+async def _expired_user(uid, order_ref="SUB_1_1_aa"):
+    async with B.get_session() as session:
+        user = await B._grant_db(session, uid, 1, "T", order_ref)
+        user.expiry_date = datetime.now() - timedelta(hours=1)
+        await session.commit()
+
+async def _user(uid):
+    async with B.get_session() as session:
+        return await B.get_user(session, uid)
+
+def test_sweep_revokes_expired_user(run, tg, wfp_cancels):
+    async def scenario():
+        await _expired_user(1)
+        stats = await B.check_subs_job()
+        user = await _user(1)
+        return stats, user
+    stats, user = run(scenario)
+    assert stats["revoked"] == 1
+    assert not user.is_active and user.active_order_ref is None
+    assert wfp_cancels == ["SUB_1_1_aa"]
+    assert len(tg.called("ban_chat_member")) == 1
+
+def test_revoke_skips_user_renewed_after_chunk_was_read(run, tg, wfp_cancels):
+    async def scenario():
+        await _expired_user(1)
+        now = datetime.now()
+        rows = [row async for chunk in B._iter_due_users(B.User.expiry_date < now) for row in chunk]
+        # Оплата применилась, пока пачка ждала своей очереди
+        async with B.get_session() as session:
+            await B._grant_db(session, 1, 30, "T", "SUB_1_2_bb", kind='payment')
+            await session.commit()
+        row = rows[0]
+        result = await B._revoke(row.telegram_id, row.active_order_ref, row.invite_link, expired_before=now)
+        return result, await _user(1)
+    result, user = run(scenario)
+    assert result is None
+    assert user.is_active and user.active_order_ref == "SUB_1_2_bb"
+    assert wfp_cancels == [] and tg.called("ban_chat_member") == []
+
+def test_failed_ban_restores_access_for_retry(run, tg, wfp_cancels):
+    tg.fail.add("ban_chat_member")
+    async def scenario():
+        await _expired_user(1)
+        before = await _user(1)
+        result = await B._revoke(1, before.active_order_ref, before.invite_link, expired_before=datetime.now())
+        return before, result, await _user(1)
+    before, result, user = run(scenario)
+    assert result is False
+    assert user.is_active and user.expiry_date == before.expiry_date
+    assert user.active_order_ref == before.active_order_ref
+
+def test_failed_ban_does_not_undo_concurrent_payment(run, tg, wfp_cancels):
+    tg.fail.add("ban_chat_member")
+    async def scenario():
+        tg.gate = asyncio.Event()
+        await _expired_user(1)
+        before = await _user(1)
+        revoke = asyncio.create_task(
+            B._revoke(1, before.active_order_ref, before.invite_link, expired_before=datetime.now())
+        )
+        while not tg.called("ban_chat_member"):
+            await asyncio.sleep(0.01)
+        async with B.get_session() as session:
+            await B._grant_db(session, 1, 30, "T", "SUB_1_2_bb", kind='payment')
+            await session.commit()
+        tg.gate.set()
+        return await revoke, await _user(1)
+    result, user = run(scenario)
+    assert result is False
+    assert user.is_active and user.active_order_ref == "SUB_1_2_bb"
+    assert user.expiry_date > datetime.now() + timedelta(days=29)
+
+def test_failed_ban_keeps_never_subscribed_user_inactive(run, tg, wfp_cancels):
+    tg.fail.add("ban_chat_member")
+    async def scenario():
+        # Только нажал /start: строка есть, подписки не было
+        async with B.get_session() as session:
+            session.add(B.User(telegram_id=1, username="u", is_active=False))
+            await session.commit()
+        result = await B._revoke(1, None, None)  # /ban
+        return result, await _user(1)
+    result, user = run(scenario)
+    assert result is False
+    assert not user.is_active and user.expiry_date is None
+
+def test_start_clears_blocked_bot(run, tg):
+    async def answer(*args, **kwargs):
+        pass
+    async def scenario():
+        await _expired_user(1)
+        await B.mark_blocked([1])
+        blocked = (await _user(1)).blocked_bot
+        message = SimpleNamespace(from_user=SimpleNamespace(id=1, username="u", full_name="U"), answer=answer)
+        await B.cmd_start(message)
+        return blocked, await _user(1)
+    blocked, user = run(scenario)
+    assert blocked and not user.blocked_bot
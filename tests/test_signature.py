@@ -0,0 +1,123 @@
+""" Корпус колбэков WayForPay: подписанные, испорченные и поддельные """
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from conftest import B
+
+FIELDS = B.WayForPaySigner.CALLBACK_FIELDS
+
+def callback(**overrides):
+    data = {"merchantAccount": B.MERCHANT_ACCOUNT, "orderReference": "SUB_42_1700000000_ab12cd34",
+            "amount": 1, "currency": "UAH", "authCode": "541963", "cardPan": "41****8217",
+            "transactionStatus": "Approved", "reasonCode": 1100, "processingDate": 1700000000}
+    data.update(overrides)
+    return data
+
+def signed(data, secret=None):
+    signer = B.WayForPaySigner(secret) if secret else B.signer
+    return {**data, "merchantSignature": signer.sign_fields(data.get(f) for f in FIELDS)}
+
+def raw_body(data):
+    """ "amount": 1.00 в теле как есть: подпись считается по тексту, который прислал WFP """
+    return json.dumps(data).replace('"amount": "1.00"', '"amount": 1.00')
+
+CORPUS = [
+    # (название, тело запроса, ожидаемый HTTP-статус)
+    ("approved", raw_body(signed(callback())), 200),
+    ("declined", raw_body(signed(callback(transactionStatus="Declined", reasonCode=1101))), 200),
+    ("amount_with_trailing_zeros", raw_body(signed(callback(amount="1.00"))), 200),
+    ("regular_charge", raw_body(signed(callback(orderReference="SUB_42_1700000000_ab12cd34_WFPREG-1"))), 200),
+    ("missing_signature", raw_body(callback()), 403),
+    ("empty_signature", raw_body({**callback(), "merchantSignature": ""}), 403),
+    ("numeric_signature", raw_body({**callback(), "merchantSignature": 12345}), 403),
+    ("uppercase_signature", raw_body({**signed(callback()),
+                                      "merchantSignature": signed(callback())["merchantSignature"].upper()}), 403),
+    ("wrong_secret", raw_body(signed(callback(), secret="not-our-secret")), 403),
+    ("foreign_merchant", raw_body(signed(callback(merchantAccount="someone_else"))), 403),
+    ("tampered_amount", raw_body({**signed(callback()), "amount": 1000}), 403),
+    ("tampered_status", raw_body({**signed(callback(transactionStatus="Declined")),
+                                  "transactionStatus": "Approved"}), 403),
+    ("tampered_order", raw_body({**signed(callback()), "orderReference": "SUB_43_1700000000_ab12cd34"}), 403),
+    ("not_json", "merchantAccount=test&amount=1", 400),
+    ("json_list", "[1, 2, 3]", 400),
+    ("oversized", json.dumps({**callback(), "pad": "x" * (B.WFP_MAX_CALLBACK_SIZE + 1)}), 413),
+]
+
+async def _post(body):
+    app = web.Application()
+    app.router.add_post(B.WEBHOOK_PATH, B.handle_wayforpay_webhook)
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.post(B.WEBHOOK_PATH, data=body, headers={"Content-Type": "application/json"})
+        return resp.status, (await resp.json() if resp.status == 200 else None)
+
+@pytest.mark.parametrize("name,body,expected", CORPUS, ids=[c[0] for c in CORPUS])
+def test_callback_corpus(run, name, body, expected):
+    status, answer = run(lambda: _post(body))
+    assert status == expected
+    if expected == 200:
+        # Ответ WFP тоже подписан: orderReference;accept;time
+        order_ref, t = answer["orderReference"], answer["time"]
+        assert answer["signature"] == B.generate_signature(f"{order_ref};accept;{t}")
+
+def test_forged_callback_never_reaches_database(run):
+    async def scenario():
+        await _post(raw_body({**signed(callback()), "amount": 1000}))
+        async with B.get_session() as session:
+            return await session.scalar(B.select(B.func.count()).select_from(B.Payment))
+    assert run(scenario) == 0
+
+def test_approved_callback_is_recorded_once(run):
+    body = raw_body(signed(callback()))
+    async def scenario():
+        await _post(body)
+        await _post(body)  # WFP повторяет колбэк, пока не получит accept
+        async with B.get_session() as session:
+            payments = (await session.scalars(B.select(B.Payment))).all()
+        return payments, B.payment_queue.qsize()
+    payments, queued = run(scenario)
+    assert [p.status for p in payments] == ['pending']
+    assert queued == 1
+
+def test_signer_matches_plain_hmac():
+    import hashlib
+    import hmac
+    text = "test_merch;SUB_1;1;UAH"
+    expected = hmac.new(B.MERCHANT_SECRET.encode(), text.encode(), hashlib.md5).hexdigest()
+    assert B.signer.sign(text) == expected
+    assert B.signer.sign(text) == expected  # копия состояния не портит ключ
+
+def test_webhook_mode_requires_secret(monkeypatch):
+    monkeypatch.setattr(B, "BOT_MODE", "webhook")
+    monkeypatch.setattr(B, "TG_WEBHOOK_SECRET", None)
+    with pytest.raises(RuntimeError):
+        B.create_app()
+
+def test_startup_pushes_rotated_secret(run, monkeypatch):
+    calls = []
+    async def set_webhook(url, **kwargs):
+        calls.append((url, kwargs))
+    async def get_webhook_info():
+        # Telegram отдает только URL - секрет из ответа не узнать
+        return type("Info", (), {"url": B.BASE_WEBHOOK_URL + B.TG_WEBHOOK_PATH})()
+    monkeypatch.setattr(B.bot, "set_webhook", set_webhook)
+    monkeypatch.setattr(B.bot, "get_webhook_info", get_webhook_info)
+    monkeypatch.setattr(B, "TG_WEBHOOK_SECRET", "rotated")
+    run(B.set_telegram_webhook)
+    assert calls == [(B.BASE_WEBHOOK_URL + B.TG_WEBHOOK_PATH, {"secret_token": "rotated"})]
+
+def test_concurrent_duplicate_callbacks_share_one_batch(run):
+    body = raw_body(signed(callback()))
+    other = raw_body(signed(callback(orderReference="SUB_43_1700000000_ab12cd34")))
+    async def scenario():
+        statuses = await asyncio.gather(_post(body), _post(body), _post(other))
+        async with B.get_session() as session:
+            payments = (await session.scalars(B.select(B.Payment).order_by(B.Payment.id))).all()
+        return statuses, payments, B.payment_queue.qsize()
+    statuses, payments, queued = run(scenario)
+    assert [s for s, _ in statuses] == [200, 200, 200]
+    assert sorted(p.order_reference for p in payments) == ["SUB_42_1700000000_ab12cd34", "SUB_43_1700000000_ab12cd34"]
+    assert queued == 2
@@ -0,0 +1,55 @@
+import asyncio
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from conftest import B
+
+def test_one_off_tariff_posts_no_regular_mode(run, monkeypatch):
+    posted = []
+    async def post(url, data, retries=None):
+        posted.append(data)
+        return {"url": "https://pay.local/1"}
+    monkeypatch.setattr(B.wfp, "post", post)
+    async def scenario():
+        await B.create_invoice(42, "once", {"name": "Разовый", "price": 3, "days": 7, "period": None})
+        await B.create_invoice(42, "1_month", B.DEFAULT_TARIFFS["1_month"])
+    run(scenario)
+    assert "regularMode" not in posted[0]
+    assert posted[1]["regularMode"] == "monthly"
+
+def test_concurrent_seeding_is_not_an_error(run, monkeypatch):
+    """ Несколько воркеров стартуют на пустом каталоге: засеет один, остальные перечитают """
+    workers = 4
+    monkeypatch.setattr(B, "TARIFFS", {})
+    async def scenario():
+        async with B.get_session() as session:
+            await session.execute(delete(B.Tariff))
+            await session.commit()
+        # Все увидели пустой каталог и коммитят одновременно: проходит только первый
+        barrier, commit = asyncio.Barrier(workers), AsyncSession.commit
+        async def racing_commit(self):
+            await barrier.wait()
+            await commit(self)
+        monkeypatch.setattr(AsyncSession, "commit", racing_commit)
+        await asyncio.gather(*(B.load_tariffs() for _ in range(workers)))
+        monkeypatch.setattr(AsyncSession, "commit", commit)
+        async with B.get_session() as session:
+            return await session.scalar(B.select(B.func.count()).select_from(B.Tariff))
+    assert run(scenario) == len(B.DEFAULT_TARIFFS)
+    assert list(B.TARIFFS) == list(B.DEFAULT_TARIFFS)
+
+def test_purchase_is_not_retried(run, monkeypatch):
+    attempts = []
+    client = B.WayForPayClient(retries=3)
+    class Session:
+        closed = False
+        def post(self, url, **kwargs):
+            attempts.append(url)
+            raise B.aiohttp.ClientConnectionError("connection reset")
+        async def close(self):
+            pass
+    client.session = Session()
+    monkeypatch.setattr(B, "wfp", client)
+    assert run(lambda: B.create_invoice(42, "1_month", B.DEFAULT_TARIFFS["1_month"])) == (None, None)
+    assert attempts == [B.WFP_PAY_URL]